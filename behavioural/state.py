@@ -1,50 +1,189 @@
 """State lets an object alter it's behaviour when the internal state changes"""
 
 from __future__ import annotations
-from abc import ABC, abstractmethod
+from abc import ABC
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+import numpy as np
 
 
 class State(ABC):
-    def __init__(self, context: Dog):
-        self.context = context
+    """States hold no per-context data, the context is passed in instead. This means
+    one instance of each state can be shared between every context in that state"""
 
-    @abstractmethod
-    def bark(self):
-        raise NotImplementedError()
+    sound: str
+
+    def bark(self, context: Dog):
+        print(self.sound)
 
 
 class NewBorn(State):
-    def bark(self):
-        print("A squeak")
+    sound = "A squeak"
 
 
 class Puppy(State):
-    def bark(self):
-        print("A high pitched yelp")
+    sound = "A high pitched yelp"
 
 
 class Adult(State):
-    def bark(self):
-        print("A deep bark")
+    sound = "A deep bark"
+
+
+class Transition(NamedTuple):
+    source: Type[State]
+    event: str
+    target: Type[State]
+    # the transition is only taken if the guard passes for the context
+    guard: Optional[Callable[[Dog], bool]] = None
+
+
+class StateMachine:
+    """Owns the one shared instance of each state, and a table of the transitions
+    between them. Contexts only need to store the small integer id of their state."""
+
+    def __init__(self, states: List[Type[State]], transitions: List[Transition]):
+        self.states: List[State] = [state() for state in states]
+        self._ids: Dict[Type[State], int] = {s: i for i, s in enumerate(states)}
+        self.transitions = transitions
+
+        # compile the declared transitions into a lookup keyed by (state id, event)
+        self._table: Dict[Tuple[int, str], List[Tuple[int, Optional[Callable]]]] = {}
+        for t in transitions:
+            key = (self.id_of(t.source), t.event)
+            self._table.setdefault(key, []).append((self.id_of(t.target), t.guard))
+
+    def id_of(self, state: Type[State]) -> int:
+        return self._ids[state]
+
+    def state_of(self, state_id: int) -> State:
+        return self.states[state_id]
+
+    def fire(self, context: Dog, event: str) -> bool:
+        """Moves the context along the first transition whose guard passes, returning
+        whether a transition was taken"""
+        for target, guard in self._table.get((context.state_id, event), ()):
+            if guard is None or guard(context):
+                context.state_id = target
+                return True
+        return False
+
+    def fire_many(self, contexts: Pack, event: str) -> np.ndarray:
+        """Same as fire, but for a whole column store of contexts at once. Guards are
+        called once with the columns, so must be written with array friendly operators
+        (eg. `dog.age >= 2` rather than `dog.age in range(2, 10)`). Returns a mask of
+        the contexts that transitioned."""
+        state_ids = contexts.state_id
+        new_ids = state_ids.copy()
+        pending = np.ones(len(state_ids), dtype=bool)
+        for (source, table_event), options in self._table.items():
+            if table_event != event:
+                continue
+            in_source = state_ids == source
+            for target, guard in options:
+                take = in_source & pending
+                if guard is not None:
+                    take &= guard(contexts)
+                new_ids[take] = target
+                pending &= ~take
+        contexts.state_id = new_ids
+        return ~pending
+
+
+DOG_STATES = StateMachine(
+    states=[NewBorn, Puppy, Adult],
+    transitions=[
+        Transition(NewBorn, "birthday", Puppy),
+        Transition(Puppy, "birthday", Adult, guard=lambda dog: dog.age >= 2),
+    ],
+)
 
 
 class Dog:
+    # no per-instance __dict__, a dog is just two small ints
+    __slots__ = ("state_id", "age")
+
     def __init__(self):
-        self.state = NewBorn(self)
+        self.state_id = DOG_STATES.id_of(NewBorn)
+        self.age = 0
+
+    @property
+    def state(self) -> State:
+        return DOG_STATES.state_of(self.state_id)
 
     def bark(self):
-        return self.state.bark()
+        return self.state.bark(self)
+
+    def change_state(self, new_state: Type[State]):
+        self.state_id = DOG_STATES.id_of(new_state)
+
+    def have_birthday(self):
+        self.age += 1
+        DOG_STATES.fire(self, "birthday")
 
-    def change_state(self, new_state: State):
-        self.state = new_state
+
+class Pack:
+    """Stores many dogs column-wise, one array per attribute, so that the whole pack
+    can be advanced through the state machine with vectorised operations"""
+
+    def __init__(self, size: int):
+        self.state_id = np.full(size, DOG_STATES.id_of(NewBorn), dtype=np.uint8)
+        self.age = np.zeros(size, dtype=np.int32)
+        # lookup table from state id to sound, so barking is a single gather
+        self._sounds = np.array([state.sound for state in DOG_STATES.states])
+
+    def __len__(self) -> int:
+        return len(self.state_id)
+
+    def __getitem__(self, i: int) -> Dog:
+        dog = Dog()
+        dog.state_id, dog.age = int(self.state_id[i]), int(self.age[i])
+        return dog
+
+    def bark(self) -> np.ndarray:
+        return self._sounds[self.state_id]
+
+    def have_birthday(self) -> np.ndarray:
+        self.age += 1
+        return DOG_STATES.fire_many(self, "birthday")
+
+    def to_dogs(self) -> List[Dog]:
+        return [self[i] for i in range(len(self))]
+
+    @classmethod
+    def from_dogs(cls, dogs: List[Dog]) -> Pack:
+        pack = cls(len(dogs))
+        pack.state_id[:] = [dog.state_id for dog in dogs]
+        pack.age[:] = [dog.age for dog in dogs]
+        return pack
 
 
 if __name__ == "__main__":
     dog = Dog()
     dog.bark()
 
-    dog.change_state(Puppy(dog))
+    dog.change_state(Puppy)
     dog.bark()
 
-    dog.change_state(Adult(dog))
+    dog.change_state(Adult)
     dog.bark()
+
+    # or let the transition table decide when the dog grows up
+    dog = Dog()
+    for _ in range(3):
+        dog.bark()
+        dog.have_birthday()
+
+    # every dog shares the same state instances
+    assert Dog().state is Dog().state
+
+    # a whole pack of dogs can grow up at once, without a python loop per dog
+    pack = Pack(1_000_000)
+    pack.state_id[::2] = DOG_STATES.id_of(Puppy)  # half the pack is a year older
+    pack.age[::2] = 1
+    pack.have_birthday()
+    print(np.unique(pack.bark(), return_counts=True))
+
+    # and individual dogs can be pulled back out when needed
+    pack[1].bark()
+    first_ten = Pack.from_dogs(pack.to_dogs()[:10])
+    assert (first_ten.bark() == pack.bark()[:10]).all()
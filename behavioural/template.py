@@ -1,19 +1,589 @@
 """Defines the skeleton of the algorithm in the superclass but lets subclasses
 override specific steps of the algorithm without changing it's structure"""
 
+from __future__ import annotations
+
+import copy
+import json
+import math
+import multiprocessing
+import os
+import pickle
+import queue
+import random
+import sys
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Iterable
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import (
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+)
+from functools import partial
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+# Data can be anything iterable, but a single pass iterator (eg. a file or a generator)
+# can only be read for one epoch. Passing a function that opens the data instead means
+# it can be streamed from the start again every epoch, without keeping it in memory.
+Source = Union[Iterable, Callable[[], Iterable]]
+
+
+def open_source(source: Source) -> Iterator:
+    return iter(source() if callable(source) else source)
+
+
+def sliced(source: Source, start: int, stop: Optional[int] = None) -> Source:
+    """Lazily takes part of a source, eg. for splitting into train/validation/test"""
+    # every split re-reads the source from the start, which a single pass iterator
+    # can't do. The later splits would silently get no rows (or misaligned ones).
+    if not callable(source) and iter(source) is source:
+        raise TypeError(
+            "Can't split a single pass iterator, pass a function that opens it instead"
+        )
+    return lambda: islice(open_source(source), start, stop)
+
+
+def batched(rows: Iterable, batch_size: int) -> Iterator[List]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def shuffled(rows: Iterable, buffer_size: int, rng: random.Random) -> Iterator:
+    """Approximately shuffles a stream while only holding buffer_size rows in memory,
+    by swapping each incoming row with a random row from the buffer"""
+    buffer = []
+    for row in rows:
+        if len(buffer) < buffer_size:
+            buffer.append(row)
+            continue
+        i = rng.randrange(buffer_size)
+        yield buffer[i]
+        buffer[i] = row
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def _decode_data(decode: Callable[[List], List], batch: Tuple[List, List]):
+    data, labels = batch
+    return decode(data), labels
+
+
+def decode_pool(workers: int = 1, use_processes: bool = False) -> Executor:
+    """A pool of workers for decoding batches, which can be shared between Prefetchers.
+
+    Processes avoid the GIL for CPU heavy decoding, but then `decode` has to be
+    picklable (eg. a module level function). They're started fresh rather than forked,
+    as they're started from the reader thread while the rest of the program carries on,
+    and forking a process that has other threads running can deadlock the child.
+    """
+    if not use_processes:
+        return ThreadPoolExecutor(max_workers=workers)
+    methods = multiprocessing.get_all_start_methods()
+    method = "forkserver" if "forkserver" in methods else "spawn"
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context(method))
+
+
+class Prefetcher:
+    """Reads batches on a background thread, and decodes them on a pool of workers,
+    so that up to `depth` batches are ready by the time the consumer asks for them.
+
+    Pass in an executor (eg. from decode_pool) to reuse one pool between Prefetchers,
+    otherwise each one starts its own, and shuts it down when it's done.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        batches: Iterable,
+        decode: Optional[Callable] = None,
+        depth: int = 2,
+        workers: int = 1,
+        use_processes: bool = False,
+        executor: Optional[Executor] = None,
+    ):
+        self.decode = decode
+        self._queue: queue.Queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._executor = executor
+        self._owns_executor = executor is None and decode is not None
+        if self._owns_executor:
+            self._executor = decode_pool(workers, use_processes)
+        self._reader = threading.Thread(target=self._read, args=(batches,), daemon=True)
+        self._reader.start()
+
+    def __iter__(self) -> Iterator:
+        try:
+            while True:
+                item = self._queue.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                # decoding happens in order of submission, so batches stay in order
+                yield item.result() if isinstance(item, Future) else item
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        if self._owns_executor:
+            self._executor.shutdown(wait=False)
+
+    def _read(self, batches: Iterable):
+        try:
+            for batch in batches:
+                if self._executor is not None:
+                    batch = self._executor.submit(self.decode, batch)
+                if not self._put(batch):
+                    return
+        except Exception as e:
+            self._put(e)
+        self._put(self._DONE)
+
+    def _put(self, item: Any) -> bool:
+        # blocks while the queue is full, which stops reading too far ahead, but gives
+        # up if the consumer has gone away
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+
+class Metric(ABC):
+    """Accumulates a metric over batches of predictions, so it can be calculated over a
+    dataset without holding all of it at once. Metrics accumulated separately (eg. in
+    different processes) can be merged together."""
+
+    name: str
+
+    @abstractmethod
+    def update(self, predictions: np.ndarray, labels: np.ndarray):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def merge(self, other: Metric):
+        raise NotImplementedError()
+
+    @abstractmethod
+    def result(self) -> float:
+        raise NotImplementedError()
+
+
+class Accuracy(Metric):
+    name = "accuracy"
+
+    def __init__(self):
+        self.correct = 0
+        self.total = 0
+
+    def update(self, predictions: np.ndarray, labels: np.ndarray):
+        self.correct += int(np.count_nonzero(predictions == labels))
+        self.total += len(labels)
+
+    def merge(self, other: Accuracy):
+        self.correct += other.correct
+        self.total += other.total
+
+    def result(self) -> float:
+        return self.correct / self.total if self.total else 0.0
+
+
+class Precision(Metric):
+    name = "precision"
+
+    def __init__(self, positive: Any = 1):
+        self.positive = positive
+        self.true_positives = 0
+        self.predicted_positives = 0
+
+    def update(self, predictions: np.ndarray, labels: np.ndarray):
+        predicted = predictions == self.positive
+        self.true_positives += int(
+            np.count_nonzero(predicted & (labels == self.positive))
+        )
+        self.predicted_positives += int(np.count_nonzero(predicted))
+
+    def merge(self, other: Precision):
+        self.true_positives += other.true_positives
+        self.predicted_positives += other.predicted_positives
+
+    def result(self) -> float:
+        if not self.predicted_positives:
+            return 0.0
+        return self.true_positives / self.predicted_positives
+
+
+class Recall(Metric):
+    name = "recall"
+
+    def __init__(self, positive: Any = 1):
+        self.positive = positive
+        self.true_positives = 0
+        self.actual_positives = 0
+
+    def update(self, predictions: np.ndarray, labels: np.ndarray):
+        actual = labels == self.positive
+        self.true_positives += int(
+            np.count_nonzero(actual & (predictions == self.positive))
+        )
+        self.actual_positives += int(np.count_nonzero(actual))
+
+    def merge(self, other: Recall):
+        self.true_positives += other.true_positives
+        self.actual_positives += other.actual_positives
+
+    def result(self) -> float:
+        return (
+            self.true_positives / self.actual_positives
+            if self.actual_positives
+            else 0.0
+        )
+
+
+class MeanLoss(Metric):
+    name = "loss"
+
+    def __init__(self, loss: Callable[[np.ndarray, np.ndarray], np.ndarray]):
+        # loss should be a module level function if evaluating in other processes
+        self.loss = loss
+        self.total = 0.0
+        self.count = 0
+
+    def update(self, predictions: np.ndarray, labels: np.ndarray):
+        self.total += float(np.sum(self.loss(predictions, labels)))
+        self.count += len(labels)
+
+    def merge(self, other: MeanLoss):
+        self.total += other.total
+        self.count += other.count
+
+    def result(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+
+def squared_error(predictions: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    return (predictions - labels) ** 2
+
+
+# the trainer used by evaluation worker processes, set once when each worker starts,
+# and the model being evaluated, which training changes between evaluations
+_worker_trainer: Optional[ModelTrainer] = None
+_worker_model: Tuple[int, Any] = (-1, None)
+
+
+def _init_worker(trainer: ModelTrainer):
+    global _worker_trainer
+    _worker_trainer = trainer
+
+
+def _calculate_metrics_in_worker(
+    evaluation: int, model_path: str, batch: Tuple[List, List]
+) -> Any:
+    global _worker_model
+    # each worker reads the model once per evaluation, rather than it being sent to
+    # the worker along with every batch
+    if _worker_model[0] != evaluation:
+        with open(model_path, "rb") as f:
+            _worker_model = (evaluation, pickle.load(f))
+    data, labels = batch
+    return _worker_trainer.calculate_metrics(data, labels, _worker_model[1])
+
+
+def _ordered_map(executor, fn: Callable, items: Iterable, max_in_flight: int):
+    """Like executor.map, but only reads max_in_flight items ahead rather than
+    submitting everything up front, so it works on streams"""
+    in_flight: deque = deque()
+    for item in items:
+        in_flight.append(executor.submit(fn, item))
+        if len(in_flight) >= max_in_flight:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+class EarlyStopping:
+    """Stops training once the monitored validation metric hasn't improved by at least
+    min_delta for `patience` epochs in a row"""
+
+    def __init__(
+        self, monitor: str, mode: str = "max", patience: int = 3, min_delta: float = 0.0
+    ):
+        if mode not in ("min", "max"):
+            raise ValueError(f"mode must be 'min' or 'max', not {mode!r}")
+        self.monitor = monitor
+        self.mode = mode
+        self.patience = patience
+        self.min_delta = min_delta
+        self.best = math.inf if mode == "min" else -math.inf
+        self.epochs_without_improvement = 0
+
+    @property
+    def stopped(self) -> bool:
+        return self.epochs_without_improvement >= self.patience
+
+    def update(self, metrics: Dict[str, float]):
+        value = metrics[self.monitor]
+        if self.mode == "min":
+            improved = value < self.best - self.min_delta
+        else:
+            improved = value > self.best + self.min_delta
+
+        if improved:
+            self.best = value
+            self.epochs_without_improvement = 0
+        else:
+            self.epochs_without_improvement += 1
+
+
+class Checkpointer:
+    """Saves training state to a directory after each epoch, and finds the latest one
+    to resume from. The state is pickled straight away so it can't change underneath
+    the save, but writing it to disk happens on a background thread."""
+
+    def __init__(self, directory: str, every: int = 1, keep: int = 2):
+        if keep < 1:
+            raise ValueError(f"keep must be at least 1, not {keep}")
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending: List[Future] = []
+
+    def save(self, epoch: int, state: Dict[str, Any]):
+        if (epoch + 1) % self.every:
+            return
+        data = pickle.dumps({"epoch": epoch, **state})
+        self._pending.append(self._writer.submit(self._write, epoch, data))
+
+    def wait(self):
+        """Blocks until every checkpoint has been written, raising any write errors"""
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def latest(self) -> Optional[Dict[str, Any]]:
+        self.wait()
+        checkpoints = self._checkpoints()
+        if not checkpoints:
+            return None
+        with open(checkpoints[-1], "rb") as f:
+            return pickle.load(f)
+
+    def _write(self, epoch: int, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"checkpoint-{epoch:06d}.pkl")
+        # write to a temporary file first, so a crash can't leave a partial checkpoint
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        for old in self._checkpoints()[: -self.keep]:
+            os.remove(old)
+
+    def _checkpoints(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith("checkpoint-") and name.endswith(".pkl")
+        )
+
+
+class TrainingProfiler:
+    """Records how long each part of each epoch takes, so you can tell whether training
+    is waiting on data or on the model.
+
+    Time spent waiting for the next training batch is recorded as "data", time in
+    do_training_iteration as "train", time waiting for the next evaluation batch as
+    "evaluation_data" and time in calculate_metrics as "metrics". The
+    results are available as a report, or as a trace file that can be opened in a
+    trace viewer (eg. chrome://tracing or https://ui.perfetto.dev).
+
+    Every span is kept in memory for write_trace, which adds up over long runs. Give a
+    trace_path instead to have spans written to the trace as they're recorded, and
+    only the current epoch's kept. Call close at the end to finish the file.
+    """
+
+    def __init__(self, trace_path: Optional[str] = None):
+        self.epochs: List[Dict[str, Any]] = []
+        self.spans: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._epoch: Optional[Dict[str, Any]] = None
+        # where the current epoch's spans start in self.spans
+        self._epoch_first_span = 0
+        self._trace: Optional[TextIO] = None
+        self._trace_separator = ""
+        if trace_path is not None:
+            # the trace event array format, which viewers accept even if it's cut off
+            self._trace = open(trace_path, "w")
+            self._trace.write("[\n")
+
+    def start_epoch(self, epoch: int):
+        self._epoch = {"epoch": epoch, "start": time.perf_counter(), "samples": 0}
+        self._epoch_first_span = len(self.spans)
+
+    def end_epoch(self):
+        epoch, self._epoch = self._epoch, None
+        seconds = time.perf_counter() - epoch.pop("start")
+        totals: Dict[str, float] = defaultdict(float)
+        batches: Dict[int, Dict[str, float]] = defaultdict(dict)
+        for span in self.spans[self._epoch_first_span :]:
+            totals[span["name"]] += span["seconds"]
+            if span["name"] in ("data", "train") and span["batch"] is not None:
+                batches[span["batch"]][f"{span['name']}_seconds"] = span["seconds"]
+
+        epoch.update(
+            seconds=seconds,
+            data_seconds=totals["data"],
+            train_seconds=totals["train"],
+            evaluation_data_seconds=totals["evaluation_data"],
+            metrics_seconds=totals["metrics"],
+            samples_per_second=epoch["samples"] / seconds if seconds else 0.0,
+            peak_memory_mb=self.peak_memory_mb(),
+            batches=[batches[i] for i in sorted(batches)],
+        )
+        self.epochs.append(epoch)
+        if self._trace is not None:
+            self.spans.clear()
+
+    @contextmanager
+    def span(self, name: str, batch: Optional[int] = None, samples: int = 0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, batch, start)
+            if self._epoch is not None:
+                self._epoch["samples"] += samples
+
+    def timed(self, items: Iterable, name: str = "data") -> Iterator:
+        """Yields from items, recording the time spent waiting for each one"""
+        items = iter(items)
+        batch = 0
+        while True:
+            start = time.perf_counter()
+            item = next(items, self)
+            if item is self:
+                # waiting to find out there's nothing left still counts
+                self._record(name, None, start)
+                return
+            self._record(name, batch, start)
+            yield item
+            batch += 1
+
+    def _record(self, name: str, batch: Optional[int], start: float):
+        span = {
+            "name": name,
+            "epoch": self._epoch["epoch"] if self._epoch else None,
+            "batch": batch,
+            "start": start - self._origin,
+            "seconds": time.perf_counter() - start,
+        }
+        if self._trace is not None:
+            self._trace.write(self._trace_separator)
+            self._trace.write(json.dumps(self._trace_event(span)))
+            self._trace_separator = ",\n"
+            if self._epoch is None:
+                return  # not needed for an epoch summary, so not kept
+        self.spans.append(span)
+
+    @staticmethod
+    def peak_memory_mb() -> Optional[float]:
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # reported in bytes on macs, but kilobytes everywhere else
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+    def report(self) -> Dict[str, Any]:
+        return {"epochs": self.epochs}
+
+    def write_report(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    def write_trace(self, path: str):
+        """Writes the spans in the chrome trace event format"""
+        events = [self._trace_event(span) for span in self.spans]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events}, f)
+
+    def close(self):
+        """Finishes the trace file, if spans are being written as they're recorded"""
+        if self._trace is not None:
+            self._trace.write("\n]\n")
+            self._trace.close()
+            self._trace = None
+
+    @staticmethod
+    def _trace_event(span: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "name": span["name"],
+            "cat": "training",
+            "ph": "X",
+            "ts": span["start"] * 1e6,
+            "dur": span["seconds"] * 1e6,
+            "pid": os.getpid(),
+            "tid": 0,
+            "args": {"epoch": span["epoch"], "batch": span["batch"]},
+        }
 
 
 class ModelTrainer(ABC):
     def __init__(
         self,
-        training_data: Iterable,
-        validation_data: Iterable,
-        test_data: Iterable,
-        validation_labels: Iterable,
-        test_labels: Iterable,
+        training_data: Source,
+        validation_data: Source,
+        test_data: Source,
+        validation_labels: Source,
+        test_labels: Source,
         model: Any,
+        batch_size: int = 32,
+        shuffle_buffer_size: int = 0,
+        seed: Optional[int] = None,
+        decode: Optional[Callable[[List], List]] = None,
+        prefetch_depth: int = 0,
+        prefetch_workers: int = 1,
+        prefetch_processes: bool = False,
+        metrics: Sequence[Metric] = (),
+        evaluation_processes: int = 0,
+        epochs: int = 10,
+        early_stopping: Optional[EarlyStopping] = None,
+        checkpointer: Optional[Checkpointer] = None,
+        profiler: Optional[TrainingProfiler] = None,
     ):
         self.training_data = training_data
         self.validation_data = validation_data
@@ -21,52 +591,258 @@ class ModelTrainer(ABC):
         self.test_data = test_data
         self.test_labels = test_labels
         self.model = model
+        self.batch_size = batch_size
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.rng = random.Random(seed)
+        self.decode = decode
+        self.prefetch_depth = prefetch_depth
+        self.prefetch_workers = prefetch_workers
+        self.prefetch_processes = prefetch_processes
+        self.metrics = metrics
+        self.evaluation_processes = evaluation_processes
+        self.epochs = epochs
+        self.early_stopping = early_stopping
+        self.checkpointer = checkpointer
+        self.profiler = profiler
+        self._evaluation_pool: Optional[ProcessPoolExecutor] = None
+        self._decode_pool: Optional[Executor] = None
+        self._evaluations = 0
+
+    def train(self, resume: bool = False):
+        first_epoch = 0
+        if resume and self.checkpointer is not None:
+            checkpoint = self.checkpointer.latest()
+            if checkpoint is not None:
+                self.restore_state(checkpoint)
+                first_epoch = checkpoint["epoch"] + 1
+                print(f"Resuming from the checkpoint after epoch {checkpoint['epoch']}")
+        if self.early_stopping is not None and self.early_stopping.stopped:
+            first_epoch = self.epochs
+
+        # one pool of evaluation workers for the whole run, started before any loader
+        # threads are, since forking a process with other threads running is unsafe
+        if self.evaluation_processes:
+            self._evaluation_pool = self._start_evaluation_pool()
+        # and one pool of decoding workers, shared by every epoch's prefetchers
+        if self.prefetch_depth and self.decode is not None:
+            self._decode_pool = decode_pool(
+                self.prefetch_workers, self.prefetch_processes
+            )
+        try:
+            self._train_epochs(first_epoch)
+            print(f"Test metrics:\n{self.evaluate(self.test_data, self.test_labels)}")
+        finally:
+            for pool in (self._evaluation_pool, self._decode_pool):
+                if pool is not None:
+                    pool.shutdown()
+            self._evaluation_pool = self._decode_pool = None
+
+    def _train_epochs(self, first_epoch: int):
+        try:
+            for i in range(first_epoch, self.epochs):
+                if self.profiler is not None:
+                    self.profiler.start_epoch(i)
+                for n, batch in enumerate(self._timed(self.training_batches(), "data")):
+                    with self._span("train", n, samples=len(batch)):
+                        self.do_training_iteration(batch, self.model)
+                metrics = self.evaluate(self.validation_data, self.validation_labels)
+                if self.profiler is not None:
+                    self.profiler.end_epoch()
+                print(f"Validation metrics after epoch {i}:\n{metrics}")
+
+                if self.early_stopping is not None:
+                    self.early_stopping.update(metrics)
+                if self.checkpointer is not None:
+                    self.checkpointer.save(i, self.checkpoint_state())
+                if self.early_stopping is not None and self.early_stopping.stopped:
+                    print(
+                        f"Stopping early, {self.early_stopping.monitor} has stopped improving"
+                    )
+                    break
+        finally:
+            # don't lose checkpoints that are still being written if training fails
+            if self.checkpointer is not None:
+                self.checkpointer.wait()
+
+    def checkpoint_state(self) -> Dict[str, Any]:
+        """Everything needed to carry on training from this point, override this to add
+        anything else that changes during training (eg. optimiser state)"""
+        return {
+            "model": self.model,
+            "rng": self.rng.getstate(),
+            "early_stopping": self.early_stopping,
+        }
+
+    def restore_state(self, state: Dict[str, Any]):
+        self.model = state["model"]
+        self.rng.setstate(state["rng"])
+        self.early_stopping = state["early_stopping"]
 
-    def train(self):
-        for i in range(10):
-            self.do_training_iteration(self.training_data, self.model)
-            print(
-                f"Validation metrics after epoch {i}:\n{self.calculate_metrics(self.validation_data, self.validation_labels, self.model)}"
+    def training_batches(self) -> Iterator[List]:
+        rows = open_source(self.training_data)
+        if self.shuffle_buffer_size:
+            rows = shuffled(rows, self.shuffle_buffer_size, self.rng)
+        return self._load(batched(rows, self.batch_size), self.decode)
+
+    def evaluation_batches(self, data: Source, labels: Source) -> Iterator[Tuple]:
+        rows = zip(open_source(data), open_source(labels))
+        # turn each batch of (row, label) pairs into a list of rows and a list of labels
+        batches = (tuple(map(list, zip(*b))) for b in batched(rows, self.batch_size))
+        decode = partial(_decode_data, self.decode) if self.decode else None
+        return self._load(batches, decode)
+
+    def evaluate(self, data: Source, labels: Source) -> Any:
+        if not self.evaluation_processes:
+            batches = self.evaluation_batches(data, labels)
+            return self.combine_metrics(
+                self._timed_calculate_metrics(batch_data, batch_labels)
+                for batch_data, batch_labels in self._timed(batches, "evaluation_data")
             )
-        print(
-            f"Test metrics:\n{self.calculate_metrics(self.test_data, self.test_labels, self.model)}"
+
+        # shard the batches between worker processes. The model has changed since the
+        # workers started, so they're pointed at a copy of the current one.
+        with self._evaluation_executor() as executor, self._span("metrics"):
+            self._evaluations += 1
+            with self._model_file() as path:
+                calculate = partial(
+                    _calculate_metrics_in_worker, self._evaluations, path
+                )
+                return self.combine_metrics(
+                    _ordered_map(
+                        executor,
+                        calculate,
+                        self.evaluation_batches(data, labels),
+                        max_in_flight=2 * self.evaluation_processes,
+                    )
+                )
+
+    @contextmanager
+    def _model_file(self) -> Iterator[str]:
+        """Writes the model to a temporary file for the evaluation workers to read"""
+        fd, path = tempfile.mkstemp(suffix=".pkl")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self.model, f)
+            yield path
+        finally:
+            os.remove(path)
+
+    @contextmanager
+    def _evaluation_executor(self) -> Iterator[ProcessPoolExecutor]:
+        """The pool started for the training run, or a new one for a one-off call"""
+        if self._evaluation_pool is not None:
+            yield self._evaluation_pool
+            return
+        with self._start_evaluation_pool() as executor:
+            yield executor
+
+    def _start_evaluation_pool(self) -> ProcessPoolExecutor:
+        # forking (where it's available) means the trainer doesn't have to be picklable
+        # to get to the workers
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        pool = ProcessPoolExecutor(
+            self.evaluation_processes,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self,),
         )
+        # workers are started lazily, so start them now before any threads exist
+        for future in [pool.submit(int) for _ in range(self.evaluation_processes)]:
+            future.result()
+        return pool
 
-    @abstractmethod
-    def do_training_iteration(self, data: Iterable, model: Any):
-        raise NotImplementedError()
+    def _timed_calculate_metrics(self, data: List, labels: List) -> Any:
+        with self._span("metrics"):
+            return self.calculate_metrics(data, labels, self.model)
+
+    def _span(self, name: str, batch: Optional[int] = None, samples: int = 0):
+        if self.profiler is None:
+            return nullcontext()
+        return self.profiler.span(name, batch, samples)
+
+    def _timed(self, batches: Iterable, name: str) -> Iterable:
+        if self.profiler is None:
+            return batches
+        return self.profiler.timed(batches, name)
+
+    def predict_batch(self, data: List, model: Any) -> np.ndarray:
+        """Gets predictions for a whole batch, override this to call the model once
+        per batch rather than once per row"""
+        return np.asarray([model(row) for row in data])
+
+    def _load(self, batches: Iterator, decode: Optional[Callable]) -> Iterator:
+        """Either reads (and decodes) the batches in the background while the current
+        one is being used, or just reads them as they're needed"""
+        if self.prefetch_depth:
+            return iter(
+                Prefetcher(
+                    batches,
+                    decode,
+                    depth=self.prefetch_depth,
+                    workers=self.prefetch_workers,
+                    use_processes=self.prefetch_processes,
+                    executor=self._decode_pool,
+                )
+            )
+        if decode is not None:
+            return map(decode, batches)
+        return batches
+
+    def calculate_metrics(self, data: List, labels: List, model: Any) -> Any:
+        """Calculates metrics for a single batch, by default by updating a fresh copy of
+        each of the trainer's metrics with predictions for the whole batch"""
+        predictions = self.predict_batch(data, model)
+        labels = np.asarray(labels)
+        metrics = [copy.deepcopy(metric) for metric in self.metrics]
+        for metric in metrics:
+            metric.update(predictions, labels)
+        return metrics
+
+    def combine_metrics(self, batch_metrics: Iterable[Any]) -> Any:
+        """Combines the metrics calculated for each batch (as they're calculated) into
+        metrics for the whole dataset"""
+        if not self.metrics:
+            return list(batch_metrics)
+
+        totals = [copy.deepcopy(metric) for metric in self.metrics]
+        for metrics in batch_metrics:
+            for total, metric in zip(totals, metrics):
+                total.merge(metric)
+        return {total.name: total.result() for total in totals}
 
     @abstractmethod
-    def calculate_metrics(self, data: Iterable, labels: Iterable, model: Any):
+    def do_training_iteration(self, data: List, model: Any):
         raise NotImplementedError()
 
 
 class MyCustomModelTrainer(ModelTrainer):
     """We don't need to reimplement all of the mechanical model training bits in this
     class, because they are implemented in the ModelTrainer class"""
-    
-    def __init__(self, data: Iterable, labels: Iterable):
+
+    def __init__(self, data: Source, labels: Source):
         model = "Initialise a model here"
 
-        # can define my test/train/val split here
-        data = list(data)
-        labels = list(labels)
+        # can define my test/train/val split here, without reading any data yet
         super().__init__(
-            training_data=data[:100],
-            validation_data=data[100:150],
-            test_data=data[150:200],
-            validation_labels=labels[100:150],
-            test_labels=labels[150:200],
+            training_data=sliced(data, 0, 100),
+            validation_data=sliced(data, 100, 150),
+            test_data=sliced(data, 150, 200),
+            validation_labels=sliced(labels, 100, 150),
+            test_labels=sliced(labels, 150, 200),
             model=model,
+            batch_size=16,
+            shuffle_buffer_size=50,
+            prefetch_depth=4,
+            metrics=[Accuracy(), Precision(positive=1), Recall(positive=1)],
+            early_stopping=EarlyStopping(monitor="accuracy", patience=3),
         )
 
-    def do_training_iteration(self, data: Iterable, model: Any):
+    def do_training_iteration(self, data: List, model: Any):
         for row in data:
             # do some training operation on the model
             pass
 
-    def calculate_metrics(self, data: Iterable, labels: Iterable, model: Any):
-        for row, label in zip(data, labels):
-            # get a result from the model
-            if model(row) == label:
-                pass
\ No newline at end of file
+    def predict_batch(self, data: List, model: Any) -> np.ndarray:
+        # get results from the model for the whole batch at once
+        return np.zeros(len(data))
@@ -15,6 +15,17 @@ to create a set of furniture with consistent style, without having to know which
 
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    TypeVar,
+)
 
 
 @dataclass
@@ -46,6 +57,12 @@ class Stool(ABC):
         pass
 
 
+class Scene(NamedTuple):
+    chair: Chair
+    table: Table
+    stool: Stool
+
+
 class Factory(ABC):
     @abstractmethod
     def createChair(self) -> Chair:
@@ -59,6 +76,12 @@ class Factory(ABC):
     def createStool(self) -> Stool:
         pass
 
+    def createScenes(self, count: int) -> List[Scene]:
+        return [
+            Scene(self.createChair(), self.createTable(), self.createStool())
+            for _ in range(count)
+        ]
+
 
 class FancyChair(Chair):
     def describe(self) -> str:
@@ -124,6 +147,102 @@ class RicketyFactory(Factory):
         return RicketyStool()
 
 
+class SharedInstanceFactory(Factory):
+    """Wraps another factory, creating each product once and then handing out that same
+    instance every time. Only safe for products that are immutable, like the ones above.
+    """
+
+    def __init__(self, factory: Factory):
+        self.factory = factory
+        self._scene = Scene(
+            factory.createChair(), factory.createTable(), factory.createStool()
+        )
+
+    def createChair(self) -> Chair:
+        return self._scene.chair
+
+    def createTable(self) -> Table:
+        return self._scene.table
+
+    def createStool(self) -> Stool:
+        return self._scene.stool
+
+    def createScenes(self, count: int) -> List[Scene]:
+        return [self._scene] * count
+
+
+T = TypeVar("T")
+
+
+class ObjectPool(Generic[T]):
+    """Keeps released objects around to be handed out again, rather than creating new
+    ones. Useful for products that have state, so can't be shared at the same time."""
+
+    def __init__(
+        self,
+        create: Callable[[], T],
+        reset: Optional[Callable[[T], None]] = None,
+        max_size: int = 1024,
+    ):
+        self.create = create
+        self.reset = reset
+        self.max_size = max_size
+        self._free: List[T] = []
+        # ids of the free items, so releasing one twice can be caught cheaply
+        self._free_ids: Set[int] = set()
+
+    def acquire(self) -> T:
+        if not self._free:
+            return self.create()
+        item = self._free.pop()
+        self._free_ids.discard(id(item))
+        return item
+
+    def release(self, item: T):
+        # otherwise the same object would be handed out to two users at once
+        if id(item) in self._free_ids:
+            raise ValueError(f"{item!r} has already been released")
+        if len(self._free) < self.max_size:
+            if self.reset is not None:
+                self.reset(item)
+            self._free.append(item)
+            self._free_ids.add(id(item))
+
+
+class PooledFactory(Factory):
+    """Wraps another factory, reusing products that have been released back to it.
+    Products with state can be given a reset function (keyed by "chair", "table" or
+    "stool"), which clears them up before they're handed out again."""
+
+    def __init__(
+        self,
+        factory: Factory,
+        max_size: int = 1024,
+        resets: Optional[Dict[str, Callable[[Any], None]]] = None,
+    ):
+        self.factory = factory
+        resets = resets or {}
+        self._pools: Dict[str, ObjectPool] = {
+            "chair": ObjectPool(factory.createChair, resets.get("chair"), max_size),
+            "table": ObjectPool(factory.createTable, resets.get("table"), max_size),
+            "stool": ObjectPool(factory.createStool, resets.get("stool"), max_size),
+        }
+
+    def createChair(self) -> Chair:
+        return self._pools["chair"].acquire()
+
+    def createTable(self) -> Table:
+        return self._pools["table"].acquire()
+
+    def createStool(self) -> Stool:
+        return self._pools["stool"].acquire()
+
+    def release(self, scene: Scene):
+        self._pools["chair"].release(scene.chair)
+        self._pools["table"].release(scene.table)
+        self._pools["stool"].release(scene.stool)
+
+
 def create_scene(factory: Factory):
     chair = factory.createChair()
     table = factory.createTable()
@@ -142,4 +261,21 @@ if __name__ == "__main__":
     create_scene(FancyFactory())
 
     print("\n\nRunning rickety create_scene:\n\n")
-    create_scene(RicketyFactory())
\ No newline at end of file
+    create_scene(RicketyFactory())
+
+    # the products don't have any state, so every scene can share the same furniture
+    scenes = SharedInstanceFactory(FancyFactory()).createScenes(1_000_000)
+    print(f"\n\n{len(scenes)} scenes, using {len({id(s.chair) for s in scenes})} chair")
+
+    # or if they did, furniture from finished scenes could be reused by new ones
+    factory = PooledFactory(RicketyFactory())
+    first = factory.createScenes(1)[0]
+    factory.release(first)
+    assert factory.createScenes(1)[0].chair is first.chair
+
+    # releasing the same scene twice would share its furniture between two scenes
+    factory.release(first)
+    try:
+        factory.release(first)
+    except ValueError as e:
+        print(e)
@@ -2,9 +2,26 @@
 The builder pattern utilises a builder object 
 """
 
+import asyncio
+import hmac
+import json
+import sys
+import time
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
-from typing import Any, Optional
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
 
 
 class Builder(ABC):
@@ -24,6 +41,20 @@ class Builder(ABC):
     def finalise(self) -> Any:
         pass
 
+    def add_endpoints(self, endpoints: Mapping[str, str]):
+        for path, response in endpoints.items():
+            self.add_endpoint(path, response)
+
+    def load_spec(self, spec_path: str):
+        """Adds everything from a JSON spec file, like:
+        {"auth": "token", "endpoints": {"path": "response", ...}}
+        """
+        with open(spec_path) as f:
+            spec = json.load(f)
+        if spec.get("auth") is not None:
+            self.add_auth(spec["auth"])
+        self.add_endpoints(spec.get("endpoints", {}))
+
 
 @dataclass
 class API:
@@ -39,6 +70,72 @@ class API:
         except KeyError as e:
             return "Error: endpoint path not found"
 
+    def respond(self, path: str, token: str = None) -> Tuple[int, str]:
+        """Same as get, along with the HTTP status of the response"""
+        if self.auth_token is not None and token != self.auth_token:
+            return 401, "Error: Unauthenticated"
+        if path not in self.endpoints:
+            return 404, "Error: endpoint path not found"
+        return 200, self.endpoints[path]
+
+
+# bound once, rather than looked up on the hmac module every call
+_compare_digest = hmac.compare_digest
+
+
+class FrozenAPI:
+    """An API that can't be changed once it's built. Everything that can be worked out
+    up front is, so each call to get is just a token comparison and a dict lookup."""
+
+    __slots__ = ("endpoints", "_auth_token", "_lookup")
+
+    UNAUTHENTICATED = "Error: Unauthenticated"
+    NOT_FOUND = "Error: endpoint path not found"
+
+    def __init__(self, endpoints: Mapping[str, str], auth_token: Optional[str] = None):
+        endpoints = MappingProxyType(dict(endpoints))
+        object.__setattr__(self, "endpoints", endpoints)
+        object.__setattr__(self, "_lookup", endpoints.get)
+        object.__setattr__(self, "_auth_token", auth_token)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"Can't set {name}, a FrozenAPI can't be changed")
+
+    def get(self, path: str, token: str = None) -> str:
+        auth_token = self._auth_token
+        if auth_token is None:
+            return self._lookup(path, self.NOT_FOUND)
+        # compare_digest takes the same time however much of the token is right, so it
+        # doesn't leak how close a guess was. The token is kept as a str, so there's
+        # nothing to encode per call unless a token has non-ASCII characters.
+        try:
+            if _compare_digest(token, auth_token):
+                return self._lookup(path, self.NOT_FOUND)
+        except TypeError:
+            if self._authorised(token):
+                return self._lookup(path, self.NOT_FOUND)
+        return self.UNAUTHENTICATED
+
+    def respond(self, path: str, token: str = None) -> Tuple[int, str]:
+        """Same as get, along with the HTTP status of the response. Responses can't be
+        told apart from errors by their text, as an endpoint could return anything."""
+        if not self._authorised(token):
+            return 401, self.UNAUTHENTICATED
+        response = self._lookup(path)
+        if response is None:
+            return 404, self.NOT_FOUND
+        return 200, response
+
+    def _authorised(self, token: Optional[str]) -> bool:
+        if self._auth_token is None:
+            return True
+        if token is None:
+            return False
+        try:
+            return _compare_digest(token, self._auth_token)
+        except TypeError:  # compare_digest only takes ASCII strings
+            return _compare_digest(token.encode(), self._auth_token.encode())
+
 
 class APIBuilder(Builder):
     def __init__(self):
@@ -50,31 +147,83 @@ class APIBuilder(Builder):
     def add_endpoint(self, path: str, response: str):
         self.api.endpoints[path] = response
 
+    def add_endpoints(self, endpoints: Mapping[str, str]):
+        self.api.endpoints.update(endpoints)
+
     def add_healthcheck(self):
         self.add_endpoint("healthcheck", "OK")
 
-    def finalise(self) -> API:
+    def finalise(self, frozen: bool = False) -> Union[API, FrozenAPI]:
+        if frozen:
+            return FrozenAPI(self.api.endpoints, self.api.auth_token)
         return self.api
 
 
 class APIDocsBuilder(Builder):
+    """Builds plain text docs. The parts are only joined together at the end, and can
+    be streamed out in chunks rather than built up into one big string."""
+
     def __init__(self):
-        self.auth_docs = "Authorisation is not required for this API"
-        self.endpoint_docs = "Endpoints:\n"
+        self.auth_token: Optional[str] = None
+        self.endpoints: List[Tuple[str, str]] = []
 
     def add_auth(self, token: str):
-        self.auth_docs = (
-            f"Authorisation is required for this API, with the token {token}"
-        )
+        self.auth_token = token
 
     def add_endpoint(self, path: str, response: str):
-        self.endpoint_docs += f"{path} -> {response}\n"
+        self.endpoints.append((path, response))
+
+    def add_endpoints(self, endpoints: Mapping[str, str]):
+        self.endpoints.extend(endpoints.items())
 
     def add_healthcheck(self):
         self.add_endpoint("healthcheck", "OK")
 
     def finalise(self) -> str:
-        return self.auth_docs + "\n" + self.endpoint_docs
+        return "".join(self.render())
+
+    def render(self) -> Iterator[str]:
+        if self.auth_token is None:
+            yield "Authorisation is not required for this API\n"
+        else:
+            yield f"Authorisation is required for this API, with the token {self.auth_token}\n"
+        yield "Endpoints:\n"
+        for path, response in self.endpoints:
+            yield f"{path} -> {response}\n"
+
+    def write(self, f: TextIO, chunk_size: int = 64 * 1024):
+        """Writes the docs to a file-like object, in chunks of about chunk_size"""
+        chunk: List[str] = []
+        size = 0
+        for part in self.render():
+            chunk.append(part)
+            size += len(part)
+            if size >= chunk_size:
+                f.write("".join(chunk))
+                chunk, size = [], 0
+        f.write("".join(chunk))
+
+
+class MarkdownAPIDocsBuilder(APIDocsBuilder):
+    def render(self) -> Iterator[str]:
+        yield "# API\n\n## Authorisation\n\n"
+        if self.auth_token is None:
+            yield "Authorisation is not required for this API\n\n"
+        else:
+            yield f"Authorisation is required for this API, with the token `{self.auth_token}`\n\n"
+        yield "## Endpoints\n\n| Path | Response |\n| --- | --- |\n"
+        for path, response in self.endpoints:
+            yield f"| `{path}` | {response} |\n"
+
+
+class JSONAPIDocsBuilder(APIDocsBuilder):
+    def render(self) -> Iterator[str]:
+        # written out a piece at a time, so the whole document is never in memory
+        yield f'{{"auth_token": {json.dumps(self.auth_token)}, "endpoints": ['
+        for i, (path, response) in enumerate(self.endpoints):
+            separator = ", " if i else ""
+            yield f"{separator}{json.dumps({'path': path, 'response': response})}"
+        yield "]}\n"
 
 
 def build_my_api(builder: Builder):
@@ -84,6 +233,168 @@ def build_my_api(builder: Builder):
     return builder.finalise()
 
 
+_STATUSES = {
+    200: b"200 OK",
+    400: b"400 Bad Request",
+    401: b"401 Unauthorized",
+    404: b"404 Not Found",
+}
+
+
+async def serve(
+    api: Union[API, FrozenAPI], host: str = "127.0.0.1", port: int = 8080
+) -> asyncio.AbstractServer:
+    """Serves a built API over HTTP/1.1. GET /<path> calls api.respond(path), with the
+    token taken from an `Authorization: Bearer <token>` header.
+
+    Connections are kept alive, and pipelined requests are answered in order. Requests
+    that can't be parsed get a 400 response, and the connection is closed."""
+
+    def write_response(
+        writer: asyncio.StreamWriter, status: int, body: bytes, keep_alive: bool
+    ):
+        writer.write(
+            b"HTTP/1.1 %s\r\nContent-Type: text/plain\r\n"
+            b"Content-Length: %d\r\nConnection: %s\r\n\r\n%s"
+            % (
+                _STATUSES[status],
+                len(body),
+                b"keep-alive" if keep_alive else b"close",
+                body,
+            )
+        )
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                    _, target, version = request_line.split(" ", 2)
+                    headers = {}
+                    for line in header_lines:
+                        if line:
+                            name, _, value = line.partition(":")
+                            headers[name.strip().lower()] = value.strip()
+                    # readexactly raises ValueError for a negative length too
+                    await reader.readexactly(int(headers.get("content-length", 0)))
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+                except (ValueError, asyncio.LimitOverrunError):
+                    # a malformed request line or Content-Length, or headers that are
+                    # too long. There's no telling where the next request would start.
+                    write_response(writer, 400, b"Error: bad request", False)
+                    await writer.drain()
+                    return
+
+                token = None
+                if headers.get("authorization", "").startswith("Bearer "):
+                    token = headers["authorization"][len("Bearer ") :]
+                status, body = api.respond(target.lstrip("/").partition("?")[0], token)
+
+                keep_alive = headers.get("connection", "").lower() != "close" and (
+                    version == "HTTP/1.1"
+                    or "keep-alive" in headers.get("connection", "")
+                )
+                write_response(writer, status, body.encode(), keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
+
+
+async def load_test(
+    host: str,
+    port: int,
+    paths: Sequence[str],
+    token: Optional[str] = None,
+    connections: int = 32,
+    requests_per_connection: int = 500,
+    pipeline_depth: int = 1,
+) -> Dict[str, float]:
+    """Sends requests from many concurrent keep-alive connections, each sending up to
+    pipeline_depth requests before waiting for the responses, and reports the request
+    rate and latency percentiles (in milliseconds)"""
+    auth = b"" if token is None else b"Authorization: Bearer %s\r\n" % token.encode()
+    requests = [
+        b"GET /%s HTTP/1.1\r\nHost: %s\r\n%s\r\n" % (path.encode(), host.encode(), auth)
+        for path in paths
+    ]
+    latencies: List[float] = []
+
+    async def connection(offset: int):
+        reader, writer = await asyncio.open_connection(host, port)
+        sent = 0
+        while sent < requests_per_connection:
+            batch = min(pipeline_depth, requests_per_connection - sent)
+            writer.write(
+                b"".join(
+                    requests[(offset + sent + i) % len(requests)] for i in range(batch)
+                )
+            )
+            start = time.perf_counter()
+            await writer.drain()
+            for _ in range(batch):
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+                await reader.readexactly(length)
+                latencies.append(time.perf_counter() - start)
+            sent += batch
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connection(i) for i in range(connections)))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(int(p / 100 * len(latencies)), len(latencies) - 1)] * 1000
+
+    return {
+        "requests": len(latencies),
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+    }
+
+
+async def _request(port: int, request: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(request)
+    response = await reader.read()
+    writer.close()
+    return response
+
+
+async def _benchmark(api: Union[API, FrozenAPI]):
+    server = await serve(api, port=0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        # the status comes from the lookup, not from what the response says
+        response = await _request(
+            port,
+            b"GET /echo_error HTTP/1.1\r\nAuthorization: Bearer fake_token\r\n"
+            b"Connection: close\r\n\r\n",
+        )
+        assert response.startswith(b"HTTP/1.1 200 OK")
+        for bad in [b"Content-Length: nope\r\n", b"X: %s\r\n" % (b"x" * 100_000)]:
+            response = await _request(port, b"GET /test HTTP/1.1\r\n%s\r\n" % bad)
+            assert response.startswith(b"HTTP/1.1 400 Bad Request")
+
+        print(await load_test("127.0.0.1", port, ["test", "healthcheck"], "fake_token"))
+        print(
+            await load_test(
+                "127.0.0.1", port, ["test", "missing"], "fake_token", pipeline_depth=16
+            )
+        )
+
+
 if __name__ == "__main__":
     builder = APIBuilder()
     api = build_my_api(builder)
@@ -94,3 +405,32 @@ if __name__ == "__main__":
     builder = APIDocsBuilder()
     docs = build_my_api(builder)  # using same function to construct docs
     print(docs)
+
+    # a frozen API can't be changed after it's built
+    builder = APIBuilder()
+    builder.add_endpoints({f"endpoint/{i}": f"response {i}" for i in range(10_000)})
+    build_my_api(builder)
+    builder.add_endpoint("echo_error", FrozenAPI.NOT_FOUND)
+    frozen_api = builder.finalise(frozen=True)
+    assert frozen_api.get("endpoint/42", "fake_token") == "response 42"
+    assert frozen_api.get("endpoint/42", "wrong_token") == FrozenAPI.UNAUTHENTICATED
+    assert frozen_api.get("missing", "fake_token") == FrozenAPI.NOT_FOUND
+
+    # hits cost about the same as on a mutable API, even with the constant time token
+    # check, and misses are much quicker since they don't raise and catch a KeyError
+    mutable_api = builder.finalise()
+    for name, built in [("API", mutable_api), ("FrozenAPI", frozen_api)]:
+        for path in ["endpoint/42", "missing"]:
+            started = time.perf_counter()
+            for _ in range(300_000):
+                built.get(path, "fake_token")
+            seconds = time.perf_counter() - started
+            print(f"300k calls to {name}.get({path!r}) took {seconds:.3f}s")
+
+    # the same builder calls can make docs in other formats, and stream them out
+    builder = MarkdownAPIDocsBuilder()
+    build_my_api(builder)
+    builder.write(sys.stdout)
+
+    # serve the API over HTTP on a local port, and see how quickly it responds
+    asyncio.run(_benchmark(frozen_api))
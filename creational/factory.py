@@ -9,8 +9,19 @@ code that uses a Factory class to create concrete objects, without having to car
 exactly which type of object you have.
 """
 
+import asyncio
+import mmap
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 
 class Model(ABC):
@@ -18,6 +29,15 @@ class Model(ABC):
     def predict(self, input):
         pass
 
+    def predict_batch(self, inputs: List) -> List:
+        """Predicts for many inputs at once. Models that can do this more efficiently
+        than one at a time should override it."""
+        return [self.predict(input) for input in inputs]
+
+    def size_bytes(self) -> int:
+        """Roughly how much memory the model takes up"""
+        return sys.getsizeof(self)
+
 
 @dataclass
 class RandomGuessModel(Model):
@@ -32,14 +52,26 @@ class XGBoostModel(Model):
     def predict(self, input):
         return "An XGBoost prediction"
 
+    def predict_batch(self, inputs: List) -> List:
+        # one call into the booster for the whole batch
+        return ["An XGBoost prediction"] * len(inputs)
+
 
 @dataclass
 class DeepLearningModel(Model):
-    model: bytes = "The binary model to execute".encode()
+    # either the model bytes, or a read-only view of a memory-mapped model file
+    model: Union[bytes, memoryview] = "The binary model to execute".encode()
 
     def predict(self, input):
         return "A Deep Learning prediction"
 
+    def predict_batch(self, inputs: List) -> List:
+        # one forward pass for the whole batch
+        return ["A Deep Learning prediction"] * len(inputs)
+
+    def size_bytes(self) -> int:
+        return sys.getsizeof(self) + len(self.model)
+
 
 class ModelFactory(ABC):
     @abstractmethod
@@ -58,9 +90,280 @@ class XGBoostModelFactory(ModelFactory):
 
 
 class DeepLearningModelFactory(ModelFactory):
+    """Creates a model from a model file, if one is given.
+
+    By default the file is memory-mapped rather than read. That means creating the
+    model doesn't have to wait for the whole file to be read, and every process that
+    maps the same file shares one copy of it in the OS page cache instead of each
+    holding its own.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_map: bool = True):
+        self.path = path
+        self.memory_map = memory_map
+
     def create(self) -> DeepLearningModel:
-        return DeepLearningModel("modeldata".encode())
+        if self.path is None:
+            return DeepLearningModel("modeldata".encode())
+
+        with open(self.path, "rb") as f:
+            # an empty file can't be mapped, but there's nothing to share anyway
+            if not self.memory_map or os.fstat(f.fileno()).st_size == 0:
+                return DeepLearningModel(f.read())
+            # the mapping stays open after the file is closed, for as long as the view
+            # of it is still referenced
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return DeepLearningModel(memoryview(mapped))
+
+
+class MicroBatchingModel(Model):
+    """Wraps a model so that single predictions made at around the same time, from
+    many threads or coroutines, are run together with one call to predict_batch.
+
+    A batch is run once it has max_batch_size inputs, or max_wait seconds after its
+    first input arrived, whichever comes first. Callers still just call predict.
+    """
+
+    def __init__(self, model: Model, max_batch_size: int = 32, max_wait: float = 0.002):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._requests: queue.Queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def predict(self, input):
+        return self.submit(input).result()
+
+    async def predict_async(self, input):
+        return await asyncio.wrap_future(self.submit(input))
+
+    def predict_batch(self, inputs: List) -> List:
+        return self.model.predict_batch(inputs)
+
+    def submit(self, input) -> Future:
+        future: Future = Future()
+        # nothing would ever run a request queued after close, so it'd wait forever
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Can't submit a prediction after close")
+            self._requests.put((input, future))
+        return future
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._requests.put(None)
+        self._worker.join()
+
+    def _run(self):
+        while True:
+            request = self._requests.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    request = self._requests.get(
+                        timeout=max(deadline - time.monotonic(), 0)
+                    )
+                except queue.Empty:
+                    break
+                if request is None:
+                    # finish off this batch before stopping
+                    self._requests.put(None)
+                    break
+                batch.append(request)
+            self._run_batch(batch)
+
+    def _run_batch(self, batch: List[Tuple[Any, Future]]):
+        # anything going wrong fails this batch's futures, rather than the worker thread,
+        # which would leave every later caller waiting forever
+        try:
+            results = list(self.model.predict_batch([input for input, _ in batch]))
+            # zip would quietly leave some callers without a result
+            if len(results) != len(batch):
+                raise ValueError(
+                    f"predict_batch returned {len(results)} results "
+                    f"for {len(batch)} inputs"
+                )
+        except Exception as e:
+            for _, future in batch:
+                if not future.cancelled():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.cancelled():
+                future.set_result(result)
+
+
+class ModelRegistry:
+    """Creates models from their factories the first time they're used, and keeps the
+    most recently used ones in memory, up to a memory budget (in bytes).
+
+    If several threads ask for a model that isn't loaded yet, it is only created once
+    and they all wait for that one copy.
+    """
+
+    def __init__(self, memory_budget: int):
+        self.memory_budget = memory_budget
+        self._factories: Dict[Tuple[str, str], ModelFactory] = {}
+        self._latest: Dict[str, str] = {}
+        self._models: "OrderedDict[Tuple[str, str], Model]" = OrderedDict()
+        self._loading: Dict[Tuple[str, str], Future] = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def register(self, name: str, version: str, factory: ModelFactory):
+        with self._lock:
+            self._factories[(name, version)] = factory
+            self._latest[name] = version
+
+    def get(self, name: str, version: Optional[str] = None) -> Model:
+        """Gets a model, or the most recently registered version if none is given"""
+        with self._lock:
+            key = (name, version or self._latest[name])
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+
+            loading = self._loading.get(key)
+            if loading is None:
+                factory = self._factories[key]
+                self._loading[key] = Future()
+
+        # some other thread is already creating this model, wait for it
+        if loading is not None:
+            return loading.result()
+
+        try:
+            model = factory.create()
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(key).set_exception(e)
+            raise
+
+        with self._lock:
+            self._models[key] = model
+            self._size += model.size_bytes()
+            self._evict()
+            self._loading.pop(key).set_result(model)
+        return model
+
+    def loaded(self) -> Tuple[Tuple[str, str], ...]:
+        with self._lock:
+            return tuple(self._models)
+
+    def _evict(self):
+        # always keep the model that was just loaded, even if it's over budget alone
+        while self._size > self.memory_budget and len(self._models) > 1:
+            _, model = self._models.popitem(last=False)
+            self._size -= model.size_bytes()
+
+
+class ModelWarmer:
+    """Creates and warms up models concurrently when a service starts, so the first
+    requests don't pay for loading them. Traffic should only be let in once ready."""
+
+    def __init__(
+        self,
+        factories: Dict[str, ModelFactory],
+        warmup_input: Any = None,
+        max_workers: int = 4,
+    ):
+        self.factories = factories
+        self.warmup_input = warmup_input
+        self.max_workers = max_workers
+        self.models: Dict[str, Model] = {}
+        self.load_times: Dict[str, float] = {}
+        self.failures: Dict[str, BaseException] = {}
+        self._done = threading.Event()
+
+    def start(self) -> "ModelWarmer":
+        """Starts warming up in the background, returning straight away"""
+        threading.Thread(target=self._warm_all, daemon=True).start()
+        return self
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set() and not self.failures
+
+    def wait_until_ready(self, timeout: Optional[float] = None) -> bool:
+        self._done.wait(timeout)
+        return self.ready
+
+    def get(self, name: str) -> Model:
+        if not self.ready:
+            raise RuntimeError(f"Models are not ready yet, can't get {name}")
+        return self.models[name]
+
+    def _warm_all(self):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            for name, factory in self.factories.items():
+                pool.submit(self._warm, name, factory)
+        self._done.set()
+
+    def _warm(self, name: str, factory: ModelFactory):
+        start = time.perf_counter()
+        try:
+            model = factory.create()
+            # the first prediction is often slower (lazy initialisation, caches, etc.)
+            model.predict(self.warmup_input)
+        except Exception as e:
+            self.failures[name] = e
+            return
+        self.models[name] = model
+        self.load_times[name] = time.perf_counter() - start
 
 
 if __name__ == "__main__":
-    pass
+    # warm everything up at once when the service starts, before accepting traffic
+    warmer = ModelWarmer(
+        {
+            "guess": RandomGuessModelFactory(),
+            "xgboost": XGBoostModelFactory(),
+            "deep": DeepLearningModelFactory(),
+        }
+    ).start()
+    if warmer.wait_until_ready(timeout=10):
+        print(f"Ready to serve, model load times: {warmer.load_times}")
+        print(warmer.get("deep").predict("some input"))
+
+    registry = ModelRegistry(memory_budget=128)
+    registry.register("guess", "1", RandomGuessModelFactory())
+    registry.register("xgboost", "1", XGBoostModelFactory())
+    registry.register("deep", "1", DeepLearningModelFactory())
+
+    # nothing is created until it's needed
+    print(registry.get("xgboost").predict("some input"))
+    print(registry.get("deep", "1").predict("some input"))
+    print(registry.get("guess").predict("some input"))
+    # the least recently used model was dropped to stay under the budget
+    print(f"Models in memory: {registry.loaded()}")
+
+    # lots of callers making single predictions get batched up behind the scenes
+    batching = MicroBatchingModel(XGBoostModelFactory().create())
+    with ThreadPoolExecutor(max_workers=64) as pool:
+        predictions = list(pool.map(batching.predict, range(1000)))
+    print(f"Made {len(predictions)} predictions")
+    batching.close()
+    try:
+        batching.predict("too late")
+    except RuntimeError as e:
+        print(e)
+
+    # models can be memory-mapped from a file, rather than read into memory
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "model.bin")
+        with open(path, "wb") as f:
+            f.write(os.urandom(1024 * 1024))
+        model = DeepLearningModelFactory(path).create()
+        print(
+            f"Mapped a {len(model.model)} byte model, read only: {model.model.readonly}"
+        )
+        model.model.release()
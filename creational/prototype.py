@@ -4,7 +4,9 @@ The Prototype patterns allows you to copy a class without becoming dependent on
 from __future__ import annotations
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, Iterable, List, Optional, Type, Union
+
+import numpy as np
 
 
 @dataclass
@@ -32,7 +34,7 @@ class Rectangle(Shape):
     def _from(self, rect: Rectangle):
         super()._from(rect)
         self.width = rect.width
-        self.height = rect.width
+        self.height = rect.height
 
     def clone(self) -> Rectangle:
         rect = Rectangle()
@@ -54,6 +56,209 @@ class Circle(Shape):
         return circle
 
 
+class CompactShape(ABC):
+    """The same shapes, but with __slots__ instead of a __dict__ per instance, which
+    makes each one noticeably smaller. Clones are made by passing the fields
+    straight to the constructor, rather than creating an empty shape and copying."""
+
+    __slots__ = ("x", "y", "colour")
+
+    def __init__(self, x: int = 0, y: int = 0, colour: str = ""):
+        self.x = x
+        self.y = y
+        self.colour = colour
+
+    @abstractmethod
+    def clone(self) -> CompactShape:
+        pass
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields())
+        return f"{type(self).__name__}({fields})"
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return all(getattr(self, f) == getattr(other, f) for f in self._fields())
+
+    @classmethod
+    def _fields(cls) -> List[str]:
+        return [
+            name
+            for c in reversed(cls.__mro__)
+            for name in c.__dict__.get("__slots__", ())
+        ]
+
+
+class CompactRectangle(CompactShape):
+    __slots__ = ("width", "height")
+
+    def __init__(
+        self, x: int = 0, y: int = 0, colour: str = "", width: int = 0, height: int = 0
+    ):
+        super().__init__(x, y, colour)
+        self.width = width
+        self.height = height
+
+    def clone(self) -> CompactRectangle:
+        return CompactRectangle(self.x, self.y, self.colour, self.width, self.height)
+
+
+class CompactCircle(CompactShape):
+    __slots__ = ("radius",)
+
+    def __init__(self, x: int = 0, y: int = 0, colour: str = "", radius: int = 0):
+        super().__init__(x, y, colour)
+        self.radius = radius
+
+    def clone(self) -> CompactCircle:
+        return CompactCircle(self.x, self.y, self.colour, self.radius)
+
+
+AnyShape = Union[Shape, CompactShape]
+
+
+class PrototypeRegistry:
+    """Keeps named, pre-configured shapes to make new shapes from, so callers don't
+    need to know how to build them, or even which class they are"""
+
+    def __init__(self):
+        self._prototypes: Dict[str, AnyShape] = {}
+
+    def register(self, name: str, prototype: AnyShape):
+        self._prototypes[name] = prototype
+
+    def unregister(self, name: str):
+        self._prototypes.pop(name, None)
+
+    def clone(self, name: str, **changes: Any) -> AnyShape:
+        """Clones the named prototype, then applies any changes (eg. x=3) to the clone"""
+        shape = self._prototypes[name].clone()
+        for field, value in changes.items():
+            setattr(shape, field, value)
+        return shape
+
+    def clone_many(self, name: str, count: int) -> List[AnyShape]:
+        clone = self._prototypes[name].clone
+        return [clone() for _ in range(count)]
+
+
+_COMMON_FIELDS = [("x", np.int32), ("y", np.int32), ("colour", np.uint16)]
+
+# the layout of each kind of shape in a ShapeStore
+SHAPE_DTYPES: Dict[Type[Shape], np.dtype] = {
+    Rectangle: np.dtype(_COMMON_FIELDS + [("width", np.int32), ("height", np.int32)]),
+    Circle: np.dtype(_COMMON_FIELDS + [("radius", np.int32)]),
+}
+
+# compact shapes have the same fields, so they're stored as the same kind
+_COMPACT_KINDS: Dict[type, Type[Shape]] = {
+    CompactRectangle: Rectangle,
+    CompactCircle: Circle,
+}
+
+
+def stored_kind(shape_type: type) -> Type[Shape]:
+    """The kind a ShapeStore stores a type of shape as, which for a subclass (eg. a
+    Square that is a Rectangle) is the nearest kind it inherits from"""
+    for cls in shape_type.__mro__:
+        if cls in SHAPE_DTYPES:
+            return cls
+        if cls in _COMPACT_KINDS:
+            return _COMPACT_KINDS[cls]
+    raise TypeError(f"A ShapeStore can't store {shape_type.__name__} shapes")
+
+
+class ShapeStore:
+    """Stores lots of shapes as a NumPy structured array per kind of shape, rather than
+    as individual objects. Cloning a range of shapes, or transforming them, is then a
+    few array operations rather than a python loop. Colours are stored as small ids
+    into a table of colour names."""
+
+    def __init__(self):
+        self.colours: List[str] = []
+        self._colour_ids: Dict[str, int] = {}
+        self._data = {kind: np.zeros(16, dtype) for kind, dtype in SHAPE_DTYPES.items()}
+        self._sizes = {kind: 0 for kind in SHAPE_DTYPES}
+
+    def __getitem__(self, kind: Type[Shape]) -> np.ndarray:
+        """A view of every stored shape of this kind, changes to it change the store"""
+        return self._data[kind][: self._sizes[kind]]
+
+    def __len__(self) -> int:
+        return sum(self._sizes.values())
+
+    def colour_id(self, colour: str) -> int:
+        if colour not in self._colour_ids:
+            self._colour_ids[colour] = len(self.colours)
+            self.colours.append(colour)
+        return self._colour_ids[colour]
+
+    def extend(self, shapes: Iterable[AnyShape]):
+        # grouped by kind in a single pass, so shapes can be a generator. Nothing is
+        # stored if any of the shapes can't be.
+        rows: Dict[Type[Shape], List[tuple]] = {kind: [] for kind in SHAPE_DTYPES}
+        kinds: Dict[type, Type[Shape]] = {}
+        for s in shapes:
+            if type(s) not in kinds:
+                kinds[type(s)] = stored_kind(type(s))
+            kind = kinds[type(s)]
+            rows[kind].append(
+                tuple(
+                    self.colour_id(s.colour) if f == "colour" else getattr(s, f)
+                    for f in SHAPE_DTYPES[kind].names
+                )
+            )
+        for kind, kind_rows in rows.items():
+            if kind_rows:
+                self._append(kind, np.array(kind_rows, dtype=SHAPE_DTYPES[kind]))
+
+    def to_shapes(self, kind: Type[Shape]) -> List[Shape]:
+        names = SHAPE_DTYPES[kind].names
+        shapes = []
+        for row in self[kind].tolist():
+            fields = dict(zip(names, row))
+            fields["colour"] = self.colours[fields["colour"]]
+            shapes.append(kind(**fields))
+        return shapes
+
+    def clone_many(
+        self,
+        kind: Type[Shape],
+        start: int = 0,
+        stop: Optional[int] = None,
+        copies: int = 1,
+    ) -> slice:
+        """Appends `copies` clones of the shapes in [start, stop), returning where the
+        clones are in the store"""
+        first = self._sizes[kind]
+        self._append(kind, np.tile(self[kind][start:stop], copies))
+        return slice(first, self._sizes[kind])
+
+    def translate(
+        self, kind: Type[Shape], dx: int, dy: int, where: slice = slice(None)
+    ):
+        shapes = self[kind][where]
+        shapes["x"] += dx
+        shapes["y"] += dy
+
+    def scale(self, kind: Type[Shape], factor: float, where: slice = slice(None)):
+        shapes = self[kind][where]
+        for name in SHAPE_DTYPES[kind].names[len(_COMMON_FIELDS) :]:
+            shapes[name] = shapes[name] * factor
+
+    def _append(self, kind: Type[Shape], rows: np.ndarray):
+        size = self._sizes[kind]
+        data = self._data[kind]
+        if size + len(rows) > len(data):
+            # grow geometrically, so appending is cheap on average
+            grown = np.zeros(max(2 * len(data), size + len(rows)), data.dtype)
+            grown[:size] = data[:size]
+            self._data[kind] = data = grown
+        data[size : size + len(rows)] = rows
+        self._sizes[kind] = size + len(rows)
+
+
 if __name__ == "__main__":
     shapes: List[Shape] = [
         Circle(x=3, y=4, radius=2),
@@ -68,4 +273,25 @@ if __name__ == "__main__":
     # we don't need to know what shapes they are exactly to make a new
     # list, just that they are shapes! Thus, this line avoid dependencies
     # on any concrete classes.
-    other_shapes: List[Shape] = [s.clone() for s in shapes]
\ No newline at end of file
+    other_shapes: List[Shape] = [s.clone() for s in shapes]
+
+    # or to clone lots of shapes at once, store them as arrays rather than objects
+    store = ShapeStore()
+    store.extend(shapes)
+    # shapes can be streamed in from a generator too, and compact shapes are stored
+    # the same way as the shapes they match
+    store.extend(s.clone() for s in shapes)
+    store.extend([CompactCircle(radius=1), CompactRectangle(width=2, height=3)])
+    assert len(store) == 2 * len(shapes) + 2
+    clones = store.clone_many(Circle, copies=1_000_000)
+    store.translate(Circle, dx=10, dy=0, where=clones)
+    print(f"{len(store)} shapes in the store, eg. {store.to_shapes(Rectangle)[0]}")
+
+    # a registry of ready made shapes to clone from, here using the compact shapes
+    registry = PrototypeRegistry()
+    registry.register("red dot", CompactCircle(colour="red", radius=1))
+    registry.register("banner", CompactRectangle(width=100, height=10, colour="blue"))
+    dots = registry.clone_many("red dot", 1_000_000)
+    banner = registry.clone("banner", x=5, y=5)
+    print(f"{len(dots)} dots like {dots[0]}, and a {banner}")
+    assert not hasattr(banner, "__dict__")
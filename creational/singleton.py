@@ -3,20 +3,157 @@ Singleton is a design pattern that lets you ensure that a class has only one ins
 while providing a global access point to this instance.
 """
 from __future__ import annotations
-from typing import Optional
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+
+class ConnectionPool:
+    """A bounded pool of connections to a SQLite database file. Connections are checked
+    before they are handed out, and replaced if they've stopped working."""
+
+    def __init__(self, path: str, size: int = 4, checkout_timeout: float = 5.0):
+        self.path = path
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._available = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "replaced": 0,
+            "in_use": 0,
+            "wait_seconds": 0.0,
+        }
+
+    @contextmanager
+    def connection(
+        self, timeout: Optional[float] = None
+    ) -> Iterator[sqlite3.Connection]:
+        conn = self.checkout(timeout)
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    def checkout(self, timeout: Optional[float] = None) -> sqlite3.Connection:
+        start = time.perf_counter()
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not self._available.acquire(timeout=timeout):
+            self._count("timeouts")
+            raise TimeoutError(f"No database connection free after {timeout}s")
+
+        # connecting can fail too, and the slot has to be given back if it does
+        try:
+            conn = self._take_idle()
+            if conn is not None and not self._is_healthy(conn):
+                self._count("replaced")
+                conn.close()
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except BaseException:
+            self._available.release()
+            raise
+
+        with self._lock:
+            self._stats["checkouts"] += 1
+            self._stats["in_use"] += 1
+            self._stats["wait_seconds"] += time.perf_counter() - start
+        return conn
+
+    def checkin(self, conn: sqlite3.Connection):
+        # don't let an unfinished transaction leak into the next checkout
+        try:
+            conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            conn.close()
+        finally:
+            self._count("in_use", -1)
+            self._available.release()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {**self._stats, "idle": self._idle.qsize(), "size": self.size}
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _take_idle(self) -> Optional[sqlite3.Connection]:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return None
+
+    def _connect(self) -> sqlite3.Connection:
+        self._count("created")
+        # connections are handed between threads, but only used by one at a time
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    @staticmethod
+    def _is_healthy(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _count(self, stat: str, amount: int = 1):
+        with self._lock:
+            self._stats[stat] += amount
 
 
 class Database:
     # NOT a dataclass in this case, it's a class attribute
     _instance: Optional[Database] = None
+    _lock = threading.Lock()
+
+    path = "database.sqlite3"
+    pool_size = 4
+    checkout_timeout = 5.0
 
     def __new__(cls) -> Database:
+        # check without the lock first, so the common case doesn't wait on it
         if not isinstance(cls._instance, cls):
-            print("This only happens once!")
-            # need to aquire lock here for thread safety
-            cls._instance = super().__new__(cls)
+            with cls._lock:
+                # someone else may have created it while we were waiting for the lock
+                if not isinstance(cls._instance, cls):
+                    print("This only happens once!")
+                    instance = super().__new__(cls)
+                    instance.pool = ConnectionPool(
+                        cls.path, cls.pool_size, cls.checkout_timeout
+                    )
+                    cls._instance = instance
         return cls._instance
 
+    def connection(self, timeout: Optional[float] = None):
+        return self.pool.connection(timeout)
+
+    def stats(self) -> Dict[str, float]:
+        return self.pool.stats()
+
+    @classmethod
+    def _reset_after_fork(cls):
+        # the parent's connections (and possibly a held lock) mustn't be used by a
+        # child process, so it starts again with its own instance when it needs one
+        cls._lock = threading.Lock()
+        cls._instance = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=Database._reset_after_fork)
+
 
 if __name__ == "__main__":
     db1 = Database()
@@ -29,3 +166,20 @@ if __name__ == "__main__":
 
     assert id(db1) == id(db2)
     assert id(db1) == id(db3)
+
+    # lots of threads starting at once still only get one instance between them
+    Database._instance = None
+    instances = set()
+    threads = [
+        threading.Thread(target=lambda: instances.add(id(Database())))
+        for _ in range(50)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(instances) == 1
+
+    with Database().connection() as conn:
+        print(conn.execute("SELECT sqlite_version()").fetchone())
+    print(Database().stats())
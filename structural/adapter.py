@@ -5,6 +5,8 @@ incompatible interfaces to collaborate.
 
 from dataclasses import dataclass
 
+import numpy as np
+
 @dataclass
 class SquarePeg():
     width: float
@@ -20,6 +22,10 @@ class RoundHole():
     def fits(self, peg: RoundPeg) -> bool:
         return peg.radius <= self.radius
 
+    def fits_many(self, radii: np.ndarray) -> np.ndarray:
+        """Which of an array of peg radii fit in this hole"""
+        return np.asarray(radii) <= self.radius
+
 class SquarePegAdapter(RoundPeg):
     """
     Must implement the RoundPeg interface, in another language we'd lock this down
@@ -31,6 +37,49 @@ class SquarePegAdapter(RoundPeg):
     def radius(self) -> float:
         return self.peg.width/2
 
+class SquarePegArrayAdapter:
+    """Adapts a whole array of square peg widths to round peg radii at once, rather
+    than wrapping each peg in its own SquarePegAdapter"""
+
+    def __init__(self, widths: np.ndarray):
+        self.widths = np.asarray(widths, dtype=float)
+
+    @property
+    def radius(self) -> np.ndarray:
+        return self.widths / 2
+
+
+class RoundHoleIndex:
+    """Many round holes, sorted by radius so that finding the holes a peg fits in is a
+    binary search rather than a check against every hole"""
+
+    def __init__(self, radii: np.ndarray):
+        self.radii = np.asarray(radii, dtype=float)
+        self._order = np.argsort(self.radii, kind="stable")
+        self._sorted = self.radii[self._order]
+
+    def fits_many(self, peg_radii: np.ndarray) -> np.ndarray:
+        """A (pegs, holes) array of which pegs fit in which holes"""
+        return np.asarray(peg_radii)[:, None] <= self.radii[None, :]
+
+    def holes_fitting(self, peg_radius: float) -> np.ndarray:
+        """The indices of every hole that the peg fits in"""
+        first = np.searchsorted(self._sorted, peg_radius, side="left")
+        return np.sort(self._order[first:])
+
+    def count_fitting(self, peg_radii: np.ndarray) -> np.ndarray:
+        """How many holes each peg fits in"""
+        return len(self._sorted) - np.searchsorted(self._sorted, peg_radii, side="left")
+
+    def tightest_fitting(self, peg_radii: np.ndarray) -> np.ndarray:
+        """The index of the smallest hole each peg fits in, or -1 if there isn't one"""
+        if not len(self._order):
+            return np.full(np.shape(peg_radii), -1, dtype=self._order.dtype)
+        first = np.searchsorted(self._sorted, peg_radii, side="left")
+        found = first < len(self._sorted)
+        return np.where(found, self._order[np.minimum(first, len(self._order) - 1)], -1)
+
+
 if __name__ == "__main__":
     hole = RoundHole(1)
     round_peg = RoundPeg(1)
@@ -42,4 +91,13 @@ if __name__ == "__main__":
 
     print(hole.fits(round_peg))
     print(hole.fits(square_peg_adapter))
-    print(hole.fits(big_square_peg_adapter))
\ No newline at end of file
+    print(hole.fits(big_square_peg_adapter))
+
+    # checking lots of square pegs at once, without an adapter per peg
+    pegs = SquarePegArrayAdapter(np.random.uniform(0, 4, 1_000_000))
+    print(f"{hole.fits_many(pegs.radius).sum()} of {len(pegs.widths)} pegs fit")
+
+    holes = RoundHoleIndex(np.random.uniform(0, 2, 1000))
+    print(f"A square peg of width 2 fits {len(holes.holes_fitting(1.0))} holes")
+    tightest = holes.tightest_fitting(pegs.radius[:5])
+    print(f"The tightest holes for the first pegs: {tightest}")
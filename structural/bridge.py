@@ -4,7 +4,11 @@ separate hierarchies - abstraction and implementation - which can be developed
 independently of each other.
 """
 
-from typing import Protocol
+import asyncio
+import random
+import threading
+import time
+from typing import Any, List, NamedTuple, Optional, Protocol
 
 
 class Device(Protocol):
@@ -43,6 +47,220 @@ class AdvancedRemote(Remote):
         self.device.set_volume(0)
 
 
+class CachingRemote(AdvancedRemote):
+    """A remote for devices that are slow to talk to. It remembers the device's state
+    instead of asking for it every time, and volume changes made within batch_window
+    seconds of each other are sent to the device as a single set_volume.
+
+    If something else might change the device, call invalidate to forget what the
+    remote remembers about it. A pending volume change is still sent if the program
+    exits during the batch window, since exiting waits for the window to end.
+    """
+
+    def __init__(self, device: Device, batch_window: float = 0.05):
+        super().__init__(device)
+        self.batch_window = batch_window
+        self._lock = threading.RLock()
+        self._volume: Optional[int] = None
+        self._enabled: Optional[bool] = None
+        self._pending_volume: Optional[int] = None
+        self._timer: Optional[threading.Timer] = None
+
+    def toggle_power(self):
+        with self._lock:
+            # keep commands in order, so send any volume change before the power change
+            self.flush()
+            if self._enabled is None:
+                self._enabled = self.device.is_enabled()
+            self.device.disable() if self._enabled else self.device.enable()
+            self._enabled = not self._enabled
+
+    def volume_down(self):
+        with self._lock:
+            self._queue_volume(self._current_volume() - 1)
+
+    def volume_up(self):
+        with self._lock:
+            self._queue_volume(self._current_volume() + 1)
+
+    def mute(self):
+        with self._lock:
+            self._queue_volume(0)
+
+    def flush(self):
+        """Sends any volume change that is waiting for the batch window to end"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending_volume is not None:
+                volume, self._pending_volume = self._pending_volume, None
+                self.device.set_volume(volume)
+
+    def invalidate(self):
+        with self._lock:
+            self.flush()
+            self._volume = None
+            self._enabled = None
+
+    def _current_volume(self) -> int:
+        if self._volume is None:
+            self._volume = self.device.get_volume()
+        return self._volume
+
+    def _queue_volume(self, volume: int):
+        self._volume = self._pending_volume = volume
+        if self.batch_window <= 0:
+            self.flush()
+        elif self._timer is None:
+            # not a daemon, so the change isn't lost if the program exits first
+            self._timer = threading.Timer(self.batch_window, self.flush)
+            self._timer.start()
+
+
+class AsyncDevice(Protocol):
+    async def is_enabled(self) -> bool:
+        raise NotImplementedError()
+
+    async def enable(self):
+        raise NotImplementedError()
+
+    async def disable(self):
+        raise NotImplementedError()
+
+    async def get_volume(self) -> int:
+        raise NotImplementedError()
+
+    async def set_volume(self, percent: int):
+        raise NotImplementedError()
+
+
+class AsyncRemote:
+    def __init__(self, device: AsyncDevice):
+        self.device = device
+
+    async def toggle_power(self):
+        if await self.device.is_enabled():
+            await self.device.disable()
+        else:
+            await self.device.enable()
+
+    async def volume_down(self):
+        await self.device.set_volume(await self.device.get_volume() - 1)
+
+    async def volume_up(self):
+        await self.device.set_volume(await self.device.get_volume() + 1)
+
+
+class AsyncAdvancedRemote(AsyncRemote):
+    async def mute(self):
+        await self.device.set_volume(0)
+
+
+class ThreadedDevice:
+    """Lets a (synchronous) Device be used as an AsyncDevice, by running its calls on
+    the event loop's thread pool"""
+
+    def __init__(self, device: Device):
+        self.device = device
+
+    async def _call(self, method: str, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, getattr(self.device, method), *args)
+
+    async def is_enabled(self) -> bool:
+        return await self._call("is_enabled")
+
+    async def enable(self):
+        return await self._call("enable")
+
+    async def disable(self):
+        return await self._call("disable")
+
+    async def get_volume(self) -> int:
+        return await self._call("get_volume")
+
+    async def set_volume(self, percent: int):
+        return await self._call("set_volume", percent)
+
+
+class CommandResult(NamedTuple):
+    device: AsyncDevice
+    ok: bool
+    result: Any = None
+    error: Optional[BaseException] = None
+
+
+class FleetController:
+    """Sends the same remote command to many devices at once, with at most
+    `concurrency` in flight, each given `timeout` seconds to respond"""
+
+    def __init__(
+        self,
+        devices: List[AsyncDevice],
+        concurrency: int = 100,
+        timeout: float = 1.0,
+    ):
+        self.remotes = [AsyncAdvancedRemote(device) for device in devices]
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    async def run(self, command: str, *args) -> List[CommandResult]:
+        """Runs a remote command (eg. "mute") on every device, returning a result per
+        device in the same order as the devices"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(remote: AsyncAdvancedRemote) -> CommandResult:
+            async with semaphore:
+                try:
+                    result = await asyncio.wait_for(
+                        getattr(remote, command)(*args), self.timeout
+                    )
+                except Exception as e:
+                    return CommandResult(remote.device, ok=False, error=e)
+                return CommandResult(remote.device, ok=True, result=result)
+
+        return await asyncio.gather(*(run_one(remote) for remote in self.remotes))
+
+    async def mute_all(self) -> List[CommandResult]:
+        return await self.run("mute")
+
+
+class SimulatedDevice:
+    """A pretend networked device, that takes a while to respond and sometimes doesn't"""
+
+    def __init__(self, latency: float = 0.02, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.enabled = False
+        self.volume = 50
+
+    async def _round_trip(self):
+        await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise ConnectionError("The device didn't respond")
+
+    async def is_enabled(self) -> bool:
+        await self._round_trip()
+        return self.enabled
+
+    async def enable(self):
+        await self._round_trip()
+        self.enabled = True
+
+    async def disable(self):
+        await self._round_trip()
+        self.enabled = False
+
+    async def get_volume(self) -> int:
+        await self._round_trip()
+        return self.volume
+
+    async def set_volume(self, percent: int):
+        await self._round_trip()
+        self.volume = percent
+
+
 class PanasonicUltraVision3000TV:
     def is_enabled(self):
         # some integration code specific to this model of TV
@@ -78,3 +296,24 @@ if __name__ == "__main__":
     remote.mute()
     remote.volume_up()
     remote.volume_down()
+
+    # the caching remote only asks the tv for its volume once, and sends a burst of
+    # button presses as one volume change
+    print("\nWith a caching remote:")
+    remote = CachingRemote(device=tv)
+    for _ in range(5):
+        remote.volume_up()
+    remote.volume_down()
+    remote.flush()
+
+    # mute every device in the venue at once
+    fleet = FleetController(
+        [SimulatedDevice(failure_rate=0.01) for _ in range(5000)], concurrency=1000
+    )
+    start = time.perf_counter()
+    results = asyncio.run(fleet.mute_all())
+    failed = sum(not result.ok for result in results)
+    print(
+        f"\nMuted {len(results) - failed} devices ({failed} failed) "
+        f"in {time.perf_counter() - start:.2f}s"
+    )
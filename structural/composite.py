@@ -3,7 +3,9 @@ Lets you compose objects into tree structures and then work with these
 structures as if they were individual objects.
 """
 
-from typing import Protocol, Set
+from __future__ import annotations
+import math
+from typing import Iterable, Optional, Protocol, Set
 
 
 class Shippable(Protocol):
@@ -13,19 +15,70 @@ class Shippable(Protocol):
 
 # This is a composite class
 class Box:
-    def __init__(self, items: Set[Shippable] = set()):
-        self.items = items
+    """Keeps a running total of the weight of everything inside it, updated as items
+    are added and removed, and passed up to any boxes this box is inside. So getting
+    the weight of a box is O(1), and changing what's in it costs O(depth).
+
+    This assumes that the weight of anything other than a Box doesn't change once it
+    has been added.
+    """
+
+    def __init__(self, items: Optional[Iterable[Shippable]] = None):
+        self.items: Set[Shippable] = set()
+        self.parent: Optional[Box] = None
+        self._weight = 0.0
+        for item in items or ():
+            self.add(item)
 
     def add(self, item: Shippable):
+        if item in self.items:
+            return
+        if isinstance(item, Box):
+            box: Optional[Box] = self
+            while box is not None:
+                if box is item:
+                    raise ValueError("Can't put a box inside itself")
+                box = box.parent
+            # a box can only be inside one other box at a time
+            if item.parent is not None:
+                item.parent.remove(item)
+            item.parent = self
         self.items.add(item)
+        self._adjust_weight(item.get_weight())
 
     def remove(self, item: Shippable):
         if item in self.items:
             self.items.remove(item)
+            if isinstance(item, Box):
+                item.parent = None
+            self._adjust_weight(-item.get_weight())
 
     # Implements Shippable protocol
     def get_weight(self) -> float:
-        return sum([item.get_weight() for item in self.items])
+        return self._weight
+
+    def recalculate_weight(self) -> float:
+        """Recomputes the weight from scratch, eg. to clear up floating point error that
+        has built up over lots of changes. Any boxes this box is inside are updated by
+        the difference."""
+        old_weight = self._weight
+        self._recalculate()
+        if self.parent is not None:
+            self.parent._adjust_weight(self._weight - old_weight)
+        return self._weight
+
+    def _recalculate(self) -> float:
+        self._weight = sum(
+            item._recalculate() if isinstance(item, Box) else item.get_weight()
+            for item in self.items
+        )
+        return self._weight
+
+    def _adjust_weight(self, delta: float):
+        box: Optional[Box] = self
+        while box is not None:
+            box._weight += delta
+            box = box.parent
 
 
 class KakapoFeather:
@@ -82,3 +135,19 @@ if __name__ == "__main__":
     )
 
     print(f"The whole shipment weighs {main_box.get_weight()}kgs ")
+
+    # changing what's in the precious box updates the weight of the whole shipment
+    precious_box.add(Compass())
+    print(f"With another compass, the shipment weighs {main_box.get_weight()}kgs ")
+
+    # a box can't end up inside itself, even by way of the boxes inside it
+    try:
+        precious_box.add(main_box)
+    except ValueError as e:
+        print(e)
+
+    # recalculating part of the shipment keeps the totals above it in step
+    shipment_weight = main_box.get_weight()
+    precious_box._adjust_weight(1)  # pretend lots of error has built up
+    precious_box.recalculate_weight()
+    assert math.isclose(main_box.get_weight(), shipment_weight)